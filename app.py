@@ -1,11 +1,13 @@
 import streamlit as st
 import pandas as pd
+import numpy as np
+import math
 import plotly.express as px
 import plotly.graph_objects as go
 from plotly.subplots import make_subplots
 from reportlab.lib import colors
 from reportlab.lib.pagesizes import A4, landscape
-from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph, Spacer, PageBreak
+from reportlab.platypus import SimpleDocTemplate, LongTable, TableStyle, Paragraph, PageBreak
 from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
 from reportlab.lib.enums import TA_CENTER
 from reportlab.lib.units import inch
@@ -55,121 +57,257 @@ st.markdown("""
 </style>
 """, unsafe_allow_html=True)
 
+# Columns the dashboard reads (names after clean_columns)
+DATA_COLUMNS = ["staff name", "department", "degree", "Contract type", "total hours", "opened clinic", "Total visits",
+                "Operation total number", "total slary", "total income", "Net",
+                "opr_elective", "opr_emergency", "opr_high", "opr_moderate", "opr_low"]
+DATA_DTYPES = {"department": "category", "degree": "category", "Contract type": "category"}
+SUM_COLUMNS = ["total hours", "opened clinic", "Total visits", "Operation total number",
+               "opr_elective", "opr_emergency", "opr_high", "opr_moderate", "opr_low",
+               "total slary", "total income", "Net"]
+DEGREE_ORDER = {"Consultant": 0, "Specialist": 1, "Resident": 2, "Other": 3}
+TOP_N = 200  # max staff bars per chart before the rest are grouped
+PAGE_SIZE = 50  # rows per page in the on-screen tables
+UPLOAD_CACHE_ENTRIES = 4  # parsed uploads kept in memory
+# Department bundles and PDFs derived from those frames: the bundled data plus each cached upload, ~16 departments each
+DEPARTMENT_CACHE_ENTRIES = (UPLOAD_CACHE_ENTRIES + 1) * 16
+# Every column except "Contract type", which has an N/A fallback
+REQUIRED_COLUMNS = [c for c in DATA_COLUMNS if c != "Contract type"]
+
 def clean_columns(df):
-    df.columns = df.columns.str.replace(r"\s+", " ", regex=True).str.strip()
+    cols = df.columns
+    # Only rewrite names when some column has leading/trailing, repeated or non-space whitespace
+    if cols.str.contains(r"^\s|\s$|\s{2,}|[^\S ]", regex=True).any():
+        df.columns = cols.str.replace(r"\s+", " ", regex=True).str.strip()
     return df
 
-def safe_sum(df, col):
-    return df[col].sum() if col in df.columns else 0
-
-def classify_degree(x):
-    x = str(x).lower()
-    if "consult" in x: return "Consultant"
-    if "special" in x: return "Specialist"
-    if "resident" in x: return "Resident"
-    return "Other"
-
-def generate_pdf(dept_df, department, detailed_tables, perf_table, op_source_table, op_value_table, fin_table):
+def classify_degree(degrees):
+    # Classify each distinct degree once, then broadcast to the rows through the categorical codes
+    degrees = degrees.astype("category")
+    s = degrees.cat.categories.astype(str).str.lower()
+    conds = [s.str.contains("consult", regex=False),
+             s.str.contains("special", regex=False),
+             s.str.contains("resident", regex=False)]
+    groups = np.append(np.select(conds, ["Consultant", "Specialist", "Resident"], default="Other"), "Other")
+    return pd.Categorical(groups[degrees.cat.codes.to_numpy()], categories=list(DEGREE_ORDER))
+
+def top_staff(df, col, n=TOP_N):
+    # Keep the n staff with the largest |col| and fold the rest into one "Others" bar per degree group.
+    # Returns (frame, capped) so charts can tell whether every staff member has a bar
+    if len(df) <= n:
+        return df, False
+    top = df.loc[df[col].abs().nlargest(n).index]
+    others = df.drop(top.index).groupby("Degree Group", sort=False, as_index=False, observed=True)[col].sum()
+    others["staff name"] = "Others (" + others["Degree Group"].astype(str) + ")"
+    return pd.concat([top, others], ignore_index=True), True
+
+def paged_dataframe(df, key):
+    # Only send one page of rows to the browser for long tables
+    n_pages = math.ceil(len(df) / PAGE_SIZE)
+    if n_pages > 1:
+        page = st.number_input(f"Page (of {n_pages})", min_value=1, max_value=n_pages, value=1, step=1, key=f"page_{key}_{n_pages}")
+        df = df.iloc[(page - 1) * PAGE_SIZE : page * PAGE_SIZE]
+    st.dataframe(df, width="stretch", hide_index=True)
+
+def table_rows(df):
+    # Header row plus rows with numbers pre-formatted column by column, so ReportLab doesn't coerce cell by cell
+    df = df.assign(**df.select_dtypes(include="integer").map("{:,.0f}".format),
+                   **df.select_dtypes(include="floating").map("{:,.2f}".format))
+    return [df.columns.tolist()] + df.to_numpy(dtype=object, copy=False).tolist()
+
+@st.cache_resource
+def pdf_styles():
+    # PDF Styles - Blue Theme; cache_resource builds them once per process instead of on every script rerun
+    styles = getSampleStyleSheet()
+    return {
+        "title": ParagraphStyle('Title', parent=styles['Heading1'], fontSize=24, textColor=colors.HexColor('#1e3a8a'), spaceAfter=50, alignment=TA_CENTER),
+        "header": ParagraphStyle('Header', parent=styles['Heading2'], fontSize=16, textColor=colors.HexColor('#2563eb'), spaceAfter=12, spaceBefore=20),
+        "table": TableStyle([
+            ('BACKGROUND', (0,0), (-1,0), colors.HexColor('#1e3a8a')), # Dark Blue Header
+            ('TEXTCOLOR', (0,0), (-1,0), colors.whitesmoke),
+            ('ALIGN', (0,0), (-1,-1), 'CENTER'),
+            ('FONTNAME', (0,0), (-1,0), 'Helvetica-Bold'),
+            ('GRID', (0,0), (-1,-1), 1, colors.grey),
+            ('ROWBACKGROUNDS', (0,1), (-1,-1), [colors.white, colors.aliceblue]),
+        ]),
+        # Same look with a spanned title row above the column headers
+        "titled_table": TableStyle([
+            ('SPAN', (0,0), (-1,0)),
+            ('BACKGROUND', (0,0), (-1,1), colors.HexColor('#1e3a8a')),
+            ('TEXTCOLOR', (0,0), (-1,1), colors.whitesmoke),
+            ('ALIGN', (0,0), (-1,-1), 'CENTER'),
+            ('FONTNAME', (0,0), (-1,1), 'Helvetica-Bold'),
+            ('FONTSIZE', (0,0), (-1,0), 12),
+            ('GRID', (0,0), (-1,-1), 1, colors.grey),
+            ('ROWBACKGROUNDS', (0,2), (-1,-1), [colors.white, colors.aliceblue]),
+        ]),
+    }
+
+def titled_table(title, df, colWidths=None):
+    # One flowable per block: the title is the table's first row and spaceAfter replaces a Spacer
+    data = table_rows(df)
+    data.insert(0, [title] + [""] * (len(data[0]) - 1))
+    t = LongTable(data, colWidths=colWidths, splitByRow=1, repeatRows=2, spaceAfter=0.2*inch)
+    t.setStyle(pdf_styles()["titled_table"])
+    return t
+
+@st.cache_data(show_spinner=False, max_entries=DEPARTMENT_CACHE_ENTRIES)
+def generate_pdf(department, detailed_tables, degree_contracts, perf_table, op_source_table, op_value_table, fin_table):
+    styles = pdf_styles()
     buffer = BytesIO()
     doc = SimpleDocTemplate(buffer, pagesize=landscape(A4), rightMargin=30, leftMargin=30, topMargin=30, bottomMargin=30)
     elements = []
-    styles = getSampleStyleSheet()
-    
-    # PDF Styles - Blue Theme
-    title_style = ParagraphStyle('Title', parent=styles['Heading1'], fontSize=24, textColor=colors.HexColor('#1e3a8a'), spaceAfter=30, alignment=TA_CENTER)
-    header_style = ParagraphStyle('Header', parent=styles['Heading2'], fontSize=16, textColor=colors.HexColor('#2563eb'), spaceAfter=12, spaceBefore=20)
     
-    elements.append(Paragraph(f"Surgical Department Report - {department}", title_style))
-    elements.append(Spacer(1, 0.3*inch))
+    elements.append(Paragraph(f"Surgical Department Report - {department}", styles["title"]))
     
     # Staff Breakdown
-    elements.append(Paragraph("Staff Breakdown by Degree", header_style))
+    elements.append(Paragraph("Staff Breakdown by Degree", styles["header"]))
     for degree, table_df in detailed_tables.items():
         total = len(table_df)
-        contracted = (table_df["Contract Type"] == "Contracted").sum() if "Contract Type" in table_df.columns else 0
-        general = (table_df["Contract Type"] == "General").sum() if "Contract Type" in table_df.columns else 0
-        elements.append(Paragraph(f"{degree}s - Total: {total} | Contracted: {contracted} | General: {general}", styles['Heading3']))
-        
-        data = [table_df.columns.tolist()] + table_df.values.tolist()
-        t = Table(data, colWidths=[4*inch, 2*inch] if "Contract Type" in table_df.columns else [6*inch])
-        t.setStyle(TableStyle([
-            ('BACKGROUND', (0,0), (-1,0), colors.HexColor('#1e3a8a')), # Dark Blue Header
-            ('TEXTCOLOR', (0,0), (-1,0), colors.whitesmoke),
-            ('ALIGN', (0,0), (-1,-1), 'CENTER'),
-            ('FONTNAME', (0,0), (-1,0), 'Helvetica-Bold'),
-            ('GRID', (0,0), (-1,-1), 1, colors.grey),
-            ('ROWBACKGROUNDS', (0,1), (-1,-1), [colors.white, colors.aliceblue]), 
-        ]))
-        elements.append(t)
-        elements.append(Spacer(1, 0.2*inch))
+        contracted = int(degree_contracts.loc[degree].get("Contracted", 0)) if degree_contracts is not None else 0
+        general = int(degree_contracts.loc[degree].get("General", 0)) if degree_contracts is not None else 0
+        title = f"{degree}s - Total: {total} | Contracted: {contracted} | General: {general}"
+        elements.append(titled_table(title, table_df, colWidths=[4*inch, 2*inch] if "Contract Type" in table_df.columns else [6*inch]))
     
     elements.append(PageBreak())
     
     # Performance Table
-    elements.append(Paragraph("Overall Performance", header_style))
-    data = [perf_table.columns.tolist()] + perf_table.values.tolist()
-    t = Table(data, colWidths=[1.5*inch, 1*inch, 0.8*inch, 0.8*inch, 0.8*inch, 0.8*inch, 0.8*inch, 0.8*inch])
-    t.setStyle(TableStyle([
-        ('BACKGROUND', (0,0), (-1,0), colors.HexColor('#1e3a8a')),
-        ('TEXTCOLOR', (0,0), (-1,0), colors.whitesmoke),
-        ('ALIGN', (0,0), (-1,-1), 'CENTER'),
-        ('FONTNAME', (0,0), (-1,0), 'Helvetica-Bold'),
-        ('GRID', (0,0), (-1,-1), 1, colors.grey),
-        ('ROWBACKGROUNDS', (0,1), (-1,-1), [colors.white, colors.aliceblue]),
-    ]))
+    elements.append(Paragraph("Overall Performance", styles["header"]))
+    data = table_rows(perf_table)
+    t = LongTable(data, colWidths=[1.5*inch, 1*inch, 0.8*inch, 0.8*inch, 0.8*inch, 0.8*inch, 0.8*inch, 0.8*inch], splitByRow=1, repeatRows=1)
+    t.setStyle(styles["table"])
     elements.append(t)
     elements.append(PageBreak())
     
     # Operations
-    elements.append(Paragraph("Operations Overview", header_style))
+    elements.append(Paragraph("Operations Overview", styles["header"]))
     for title, table in [("Operation Source", op_source_table), ("Operation Value", op_value_table)]:
-        elements.append(Paragraph(title, styles['Heading3']))
-        data = [table.columns.tolist()] + table.values.tolist()
-        t = Table(data)
-        t.setStyle(TableStyle([
-            ('BACKGROUND', (0,0), (-1,0), colors.HexColor('#1e3a8a')),
-            ('TEXTCOLOR', (0,0), (-1,0), colors.whitesmoke),
-            ('ALIGN', (0,0), (-1,-1), 'CENTER'),
-            ('FONTNAME', (0,0), (-1,0), 'Helvetica-Bold'),
-            ('GRID', (0,0), (-1,-1), 1, colors.grey),
-            ('ROWBACKGROUNDS', (0,1), (-1,-1), [colors.white, colors.aliceblue]),
-        ]))
-        elements.append(t)
-        elements.append(Spacer(1, 0.2*inch))
+        elements.append(titled_table(title, table))
     
     elements.append(PageBreak())
     
     # Financial
-    elements.append(Paragraph("Financial Performance", header_style))
-    data = [fin_table.columns.tolist()] + fin_table.values.tolist()
-    t = Table(data, colWidths=[2*inch, 1.5*inch, 1.5*inch, 1.5*inch, 1.5*inch])
-    t.setStyle(TableStyle([
-        ('BACKGROUND', (0,0), (-1,0), colors.HexColor('#1e3a8a')),
-        ('TEXTCOLOR', (0,0), (-1,0), colors.whitesmoke),
-        ('ALIGN', (0,0), (-1,-1), 'CENTER'),
-        ('FONTNAME', (0,0), (-1,0), 'Helvetica-Bold'),
-        ('GRID', (0,0), (-1,-1), 1, colors.grey),
-        ('ROWBACKGROUNDS', (0,1), (-1,-1), [colors.white, colors.aliceblue]),
-    ]))
+    elements.append(Paragraph("Financial Performance", styles["header"]))
+    data = table_rows(fin_table)
+    t = LongTable(data, colWidths=[2*inch, 1.5*inch, 1.5*inch, 1.5*inch, 1.5*inch], splitByRow=1, repeatRows=1)
+    t.setStyle(styles["table"])
     elements.append(t)
     
     doc.build(elements)
-    buffer.seek(0)
-    return buffer
+    return buffer.getvalue()
 
 # Main App
 st.markdown('<h1 class="main-title">🏥 Surgical Department Analytics</h1>', unsafe_allow_html=True)
 st.markdown('<p class="subtitle">Comprehensive Performance & Financial Analysis Dashboard</p>', unsafe_allow_html=True)
 
-@st.cache_data
-def load_data():
-    return pd.read_csv("data.csv")
+def load_df(file_bytes, file_type="csv"):
+    # Parquet keeps its stored dtypes; CSV goes through pyarrow's multithreaded columnar parser.
+    # dtypes are applied after parsing: read_csv's pyarrow engine fails on blank numeric cells when dtype= is passed
+    if file_type == "parquet":
+        df = pd.read_parquet(BytesIO(file_bytes))
+    else:
+        df = pd.read_csv(BytesIO(file_bytes), engine="pyarrow")
+    df = clean_columns(df)
+    df = df.loc[:, df.columns.isin(DATA_COLUMNS)]
+    return df.astype({c: t for c, t in DATA_DTYPES.items() if c in df.columns})
+
+# The bundled data.csv persists across restarts; uploads (staff salary data) stay in a bounded in-memory cache.
+# Each path needs its own function: Streamlit keys caches by function, and differing params would reset a shared one
+@st.cache_data(show_spinner=False, persist="disk")
+def load_bundled_df(file_bytes):
+    return load_df(file_bytes)
+
+@st.cache_data(show_spinner=False, max_entries=UPLOAD_CACHE_ENTRIES)
+def load_uploaded_df(file_bytes, file_type):
+    return load_df(file_bytes, file_type)
+
+@st.cache_data(show_spinner=False, max_entries=DEPARTMENT_CACHE_ENTRIES)
+def build_department_bundle(df, department):
+    dept_df = df.loc[df["department"] == department]
+    dept_df = dept_df.assign(**{"Degree Group": classify_degree(dept_df["degree"])})
+
+    # Degree Group x Contract type counts in one pass; the department totals are its column sums
+    degree_contracts = (dept_df.groupby(["Degree Group", "Contract type"], observed=True).size()
+                        .unstack(fill_value=0).reindex(list(DEGREE_ORDER), fill_value=0)
+                        if "Contract type" in dept_df.columns else None)
+    contract_counts = degree_contracts.sum() if degree_contracts is not None else None
+
+    # Staff Breakdown tables per degree, split in a single groupby pass
+    groups = dict(list(dept_df.groupby("Degree Group", sort=False, observed=True)))
+    detailed_tables = {}
+    for degree in ["Consultant", "Specialist", "Resident"]:
+        deg_df = groups.get(degree)
+        if deg_df is None:
+            continue
+        if "Contract type" in deg_df.columns:
+            table_df = deg_df[["staff name", "Contract type"]].set_axis(["Staff Name", "Contract Type"], axis=1)
+        else:
+            table_df = deg_df[["staff name"]].set_axis(["Staff Name"], axis=1)
+        detailed_tables[degree] = table_df
+
+    # One fused reduction over every summed column (presence and numeric dtype are checked at load)
+    sums = pd.Series(np.nansum(dept_df[SUM_COLUMNS].to_numpy(dtype=np.float64), axis=0), index=SUM_COLUMNS)
+
+    staff_sorted_df = dept_df.sort_values(by="Degree Group", key=lambda g: g.map(DEGREE_ORDER).astype("int8"), kind="stable")
+
+    # Staff bar chart frames, capped and sorted once per department
+    bar_frames, bars_capped = {}, {}
+    for col in ["opened clinic", "Operation total number", "Net"]:
+        frame, bars_capped[col] = top_staff(staff_sorted_df, col)
+        bar_frames[col] = frame.sort_values(col, ascending=True, kind="stable")
+
+    # Detailed Tables
+    perf_table = staff_sorted_df[["staff name", "degree", "total hours", "opened clinic", "Total visits", "Operation total number"]].set_axis(
+        ["Staff Name", "Degree", "Total Hours", "Opened Clinics", "Total Visits", "Total Operations"], axis=1)
+    perf_table = perf_table.assign(**{
+        "Avg. Clinics": (perf_table["Opened Clinics"].to_numpy() / 10).round(2),
+        "Avg. Operations": (perf_table["Total Operations"].to_numpy() / 10).round(2),
+    })
+
+    op_source_table = staff_sorted_df[["staff name", "degree", "opr_elective", "opr_emergency", "Operation total number"]].set_axis(
+        ["Staff Name", "Degree", "Elective", "Emergency", "Total Operations"], axis=1)
+
+    op_value_table = staff_sorted_df[["staff name", "degree", "opr_high", "opr_moderate", "opr_low", "Operation total number"]].set_axis(
+        ["Staff Name", "Degree", "High", "Moderate", "Low", "Total Operations"], axis=1)
+
+    fin_table = staff_sorted_df[["staff name", "degree", "total slary", "total income", "Net"]].set_axis(
+        ["Staff Name", "Degree", "Total Salary", "Total Income", "Net Income"], axis=1)
+
+    return {
+        "dept_df": dept_df,
+        "contract_counts": contract_counts,
+        "detailed_tables": detailed_tables,
+        "degree_contracts": degree_contracts,
+        "sums": sums,
+        "staff_sorted_df": staff_sorted_df,
+        "bar_frames": bar_frames,
+        "bars_capped": bars_capped,
+        "perf_table": perf_table,
+        "op_source_table": op_source_table,
+        "op_value_table": op_value_table,
+        "fin_table": fin_table,
+    }
+
+uploaded_file = st.sidebar.file_uploader("Upload Staff Data (CSV or Parquet)", type=["csv", "parquet"])
+data_name = uploaded_file.name if uploaded_file is not None else "data.csv"
 
 try:
-    df = load_data()
-    df = clean_columns(df)
+    if uploaded_file is not None:
+        df = load_uploaded_df(uploaded_file.getvalue(), "parquet" if data_name.lower().endswith(".parquet") else "csv")
+    else:
+        with open("data.csv", "rb") as f:
+            df = load_bundled_df(f.read())
+
+    missing = [c for c in REQUIRED_COLUMNS if c not in df.columns]
+    if missing:
+        st.error(f"❌ {data_name} is missing required columns: {', '.join(missing)}")
+        st.stop()
+    non_numeric = [c for c in SUM_COLUMNS if not pd.api.types.is_numeric_dtype(df[c])]
+    if non_numeric:
+        st.error(f"❌ {data_name} has non-numeric values in: {', '.join(non_numeric)}")
+        st.stop()
 except Exception as e:
-    st.error(f"❌ Failed to load data.csv: {e}")
+    st.error(f"❌ Failed to load {data_name}: {e}")
     st.stop()
 with st.sidebar:
     st.markdown("### 🏥 Department Selection")
@@ -182,194 +320,183 @@ with st.sidebar:
     st.metric("Total Departments", df["department"].nunique())
     st.metric("Total Staff", len(df))
 
-    
-    if "department" not in df.columns:
-        st.error("❌ CSV must contain 'department' column")
-        st.stop()
-    
+# Blue Palette for Charts
+blue_colors_source = ['#1e3a8a', '#60a5fa'] # Dark Blue, Light Blue
+blue_colors_value = ['#172554', '#2563eb', '#93c5fd'] # Darkest, Mid, Lightest
 
-    
-dept_df = df[df["department"] == department].copy()
-dept_df["Degree Group"] = dept_df["degree"].apply(classify_degree) if "degree" in dept_df.columns else "Other"
-
-# Manpower Overview (Modified: 3 cards only)
-st.markdown('<div class="section-header">👥 Manpower Overview</div>', unsafe_allow_html=True)
-total_staff = len(dept_df)
-col1, col2, col3 = st.columns(3)
-col1.metric("Total Staff", total_staff)
-
-if "Contract type" in dept_df.columns:
-    contract_counts = dept_df["Contract type"].value_counts()
-    cont_val = contract_counts.get("Contracted", 0)
-    cont_pct = (cont_val/total_staff*100) if total_staff else 0
-    col2.metric("Contracted", f"{cont_val} ({cont_pct:.1f}%)")
-    
-    gen_val = contract_counts.get("General", 0)
-    gen_pct = (gen_val/total_staff*100) if total_staff else 0
-    col3.metric("General", f"{gen_val} ({gen_pct:.1f}%)")
-else:
-    col2.metric("Contracted", "N/A")
-    col3.metric("General", "N/A")
-
-# Staff Breakdown (Modified: 3 cards per degree)
-st.markdown('<div class="section-header">📋 Staff Breakdown by Degree</div>', unsafe_allow_html=True)
-detailed_tables = {}
-
-for degree in ["Consultant", "Specialist", "Resident"]:
-    deg_df = dept_df[dept_df["Degree Group"] == degree]
-    if not deg_df.empty:
-        total_deg = len(deg_df)
+# Blue color scale for bars
+blue_scale_map = {"Consultant": "#1e3a8a", "Specialist": "#3b82f6", "Resident": "#93c5fd", "Other": "#e0f2fe"}
+
+# Each section is a fragment, so a widget inside one section (page selectors, tabs, PDF button) only reruns that section
+
+@st.fragment
+def manpower_overview(bundle):
+    # Manpower Overview (Modified: 3 cards only)
+    st.markdown('<div class="section-header">👥 Manpower Overview</div>', unsafe_allow_html=True)
+    total_staff = len(bundle["dept_df"])
+    col1, col2, col3 = st.columns(3)
+    col1.metric("Total Staff", total_staff)
+
+    contract_counts = bundle["contract_counts"]
+    if contract_counts is not None:
+        cont_val = contract_counts.get("Contracted", 0)
+        cont_pct = (cont_val/total_staff*100) if total_staff else 0
+        col2.metric("Contracted", f"{cont_val} ({cont_pct:.1f}%)")
+        
+        gen_val = contract_counts.get("General", 0)
+        gen_pct = (gen_val/total_staff*100) if total_staff else 0
+        col3.metric("General", f"{gen_val} ({gen_pct:.1f}%)")
+    else:
+        col2.metric("Contracted", "N/A")
+        col3.metric("General", "N/A")
+
+@st.fragment
+def staff_breakdown(bundle):
+    # Staff Breakdown (Modified: 3 cards per degree)
+    st.markdown('<div class="section-header">📋 Staff Breakdown by Degree</div>', unsafe_allow_html=True)
+    degree_contracts = bundle["degree_contracts"]
+
+    for degree, table_df in bundle["detailed_tables"].items():
+        total_deg = len(table_df)
         st.markdown(f"#### 👨‍⚕️ {degree}s")
         
         # 3 Cards per Degree
         c1, c2, c3 = st.columns(3)
         c1.metric("Total", total_deg)
         
-        if "Contract type" in deg_df.columns:
-            contracted = (deg_df["Contract type"] == "Contracted").sum()
-            general = (deg_df["Contract type"] == "General").sum()
+        if degree_contracts is not None:
+            contracted = int(degree_contracts.loc[degree].get("Contracted", 0))
+            general = int(degree_contracts.loc[degree].get("General", 0))
             c2.metric("Contracted", contracted)
             c3.metric("General", general)
-            table_df = deg_df[["staff name", "Contract type"]].copy()
-            table_df.columns = ["Staff Name", "Contract Type"]
         else:
             c2.metric("Contracted", "N/A")
             c3.metric("General", "N/A")
-            table_df = deg_df[["staff name"]].copy()
-            table_df.columns = ["Staff Name"]
         
-        st.dataframe(table_df, use_container_width=True, hide_index=True)
-        detailed_tables[degree] = table_df
+        paged_dataframe(table_df, key=f"staff_{degree}")
         st.markdown("---")
 
-# Performance Metrics
-st.markdown('<div class="section-header">📊 Performance Metrics</div>', unsafe_allow_html=True)
-col1, col2, col3, col4 = st.columns(4)
-col1.metric("Total Hours", f"{safe_sum(dept_df, 'total hours'):,.0f}")
-col2.metric("Opened Clinics", f"{safe_sum(dept_df, 'opened clinic'):,.0f}")
-col3.metric("Total Visits", f"{safe_sum(dept_df, 'Total visits'):,.0f}")
-col4.metric("Total Operations", f"{safe_sum(dept_df, 'Operation total number'):,.0f}")
-
-# Operations Overview
-st.markdown('<div class="section-header">🛠️ Operations Overview</div>', unsafe_allow_html=True)
-elective = safe_sum(dept_df, "opr_elective")
-emergency = safe_sum(dept_df, "opr_emergency")
-high = safe_sum(dept_df, "opr_high")
-moderate = safe_sum(dept_df, "opr_moderate")
-low = safe_sum(dept_df, "opr_low")
-
-# Blue Palette for Charts
-blue_colors_source = ['#1e3a8a', '#60a5fa'] # Dark Blue, Light Blue
-blue_colors_value = ['#172554', '#2563eb', '#93c5fd'] # Darkest, Mid, Lightest
-
-col1, col2 = st.columns(2)
-with col1:
-    fig = go.Figure(data=[go.Pie(labels=['Elective', 'Emergency'], values=[elective, emergency], hole=0.4, marker_colors=blue_colors_source)])
-    fig.update_layout(title="Operation Source", height=350)
-    st.plotly_chart(fig, use_container_width=True)
-
-with col2:
-    fig = go.Figure(data=[go.Pie(labels=['High', 'Moderate', 'Low'], values=[high, moderate, low], hole=0.4, marker_colors=blue_colors_value)])
-    fig.update_layout(title="Operation Value", height=350)
-    st.plotly_chart(fig, use_container_width=True)
-
-# Financial Performance
-st.markdown('<div class="section-header">💰 Financial Performance</div>', unsafe_allow_html=True)
-total_salary = safe_sum(dept_df, "total slary")
-total_income = safe_sum(dept_df, "total income")
-total_net = safe_sum(dept_df, "Net")
-
-col1, col2, col3 = st.columns(3)
-col1.metric("Total Salary", f"${total_salary:,.0f}")
-col2.metric("Total Income", f"${total_income:,.0f}")
-col3.metric("Net Income", f"${total_net:,.0f} ({(total_net/total_income*100 if total_income else 0):.1f}%)")
-
-# Staff Analytics
-st.markdown('<div class="section-header">👤 Staff Performance Analytics</div>', unsafe_allow_html=True)
-
-degree_order = ["Consultant", "Specialist", "Resident", "Other"]
-dept_df["Degree Group"] = pd.Categorical(dept_df["Degree Group"], categories=degree_order, ordered=True)
-staff_sorted_df = dept_df.sort_values(by="Degree Group")
-
-# Blue color scale for bars
-blue_scale_map = {"Consultant": "#1e3a8a", "Specialist": "#3b82f6", "Resident": "#93c5fd", "Other": "#e0f2fe"}
+@st.fragment
+def performance_metrics(bundle):
+    sums = bundle["sums"]
+    st.markdown('<div class="section-header">📊 Performance Metrics</div>', unsafe_allow_html=True)
+    col1, col2, col3, col4 = st.columns(4)
+    col1.metric("Total Hours", f"{sums['total hours']:,.0f}")
+    col2.metric("Opened Clinics", f"{sums['opened clinic']:,.0f}")
+    col3.metric("Total Visits", f"{sums['Total visits']:,.0f}")
+    col4.metric("Total Operations", f"{sums['Operation total number']:,.0f}")
+
+@st.fragment
+def operations_overview(bundle):
+    sums = bundle["sums"]
+    st.markdown('<div class="section-header">🛠️ Operations Overview</div>', unsafe_allow_html=True)
+
+    # Both pies in one figure, so a single layout is sent to the browser
+    fig = make_subplots(rows=1, cols=2, specs=[[{"type": "domain"}, {"type": "domain"}]], subplot_titles=["Operation Source", "Operation Value"])
+    fig.add_trace(go.Pie(labels=['Elective', 'Emergency'], values=[sums["opr_elective"], sums["opr_emergency"]], hole=0.4, marker_colors=blue_colors_source), 1, 1)
+    fig.add_trace(go.Pie(labels=['High', 'Moderate', 'Low'], values=[sums["opr_high"], sums["opr_moderate"], sums["opr_low"]], hole=0.4, marker_colors=blue_colors_value), 1, 2)
+    fig.update_layout(height=350)
+    st.plotly_chart(fig, width="stretch")
+
+@st.fragment
+def financial_performance(bundle):
+    sums = bundle["sums"]
+    st.markdown('<div class="section-header">💰 Financial Performance</div>', unsafe_allow_html=True)
+    total_salary = sums["total slary"]
+    total_income = sums["total income"]
+    total_net = sums["Net"]
+
+    col1, col2, col3 = st.columns(3)
+    col1.metric("Total Salary", f"${total_salary:,.0f}")
+    col2.metric("Total Income", f"${total_income:,.0f}")
+    col3.metric("Net Income", f"${total_net:,.0f} ({(total_net/total_income*100 if total_income else 0):.1f}%)")
+
+@st.fragment
+def staff_analytics(bundle):
+    sums = bundle["sums"]
+    bar_frames = bundle["bar_frames"]
+    # "(All)" only when no staff were folded into an "Others" bar
+    scope = {col: "" if capped else " (All)" for col, capped in bundle["bars_capped"].items()}
+    st.markdown('<div class="section-header">👤 Staff Performance Analytics</div>', unsafe_allow_html=True)
+
+    # Dynamic Height Calculation (25px per bar + buffer); at most TOP_N staff bars plus one "Others" bar per degree
+    dynamic_height = max(400, 200 + (min(len(bundle["staff_sorted_df"]), TOP_N + len(DEGREE_ORDER)) * 25))
+
+    # Lazy tabs: switching tabs reruns this section and only the open tab builds its charts
+    tab1, tab2, tab3 = st.tabs(["🏥 Clinics", "⚕️ Operations", "💵 Financial"], key="staff_tabs", on_change="rerun")
+
+    with tab1:
+        if tab1.open:
+            fig = px.bar(bar_frames["opened clinic"], 
+                         y="staff name", x="opened clinic", 
+                         color="Degree Group", title=f"Clinics by Staff{scope['opened clinic']}", orientation='h',
+                         color_discrete_map=blue_scale_map)
+            fig.update_layout(height=dynamic_height)
+            st.plotly_chart(fig, width="stretch")
+
+    with tab2:
+        if tab2.open:
+            fig = px.bar(bar_frames["Operation total number"], 
+                         y="staff name", x="Operation total number", 
+                         color="Degree Group", title=f"Operations by Staff{scope['Operation total number']}", orientation='h',
+                         color_discrete_map=blue_scale_map)
+            fig.update_layout(height=dynamic_height)
+            st.plotly_chart(fig, width="stretch")
+        
+            col1, col2 = st.columns(2)
+            with col1:
+                fig = px.bar(x=["Elective", "Emergency"], y=[sums["opr_elective"], sums["opr_emergency"]], title="Operations by Type", 
+                             color=["Elective", "Emergency"], color_discrete_map={"Elective": "#1e3a8a", "Emergency": "#60a5fa"})
+                st.plotly_chart(fig, width="stretch")
+            with col2:
+                fig = px.bar(x=["High", "Moderate", "Low"], y=[sums["opr_high"], sums["opr_moderate"], sums["opr_low"]], title="Operations by Value",
+                             color=["High", "Moderate", "Low"], color_discrete_map={"High": "#172554", "Moderate": "#2563eb", "Low": "#93c5fd"})
+                st.plotly_chart(fig, width="stretch")
+
+    with tab3:
+        if tab3.open:
+            fig = px.bar(bar_frames["Net"], 
+                         y="staff name", x="Net",
+                         color="Degree Group", title=f"Net Income by Staff{scope['Net']}", orientation='h',
+                         color_discrete_map=blue_scale_map)
+            fig.update_layout(height=dynamic_height)
+            st.plotly_chart(fig, width="stretch")
+
+@st.fragment
+def detailed_tables_section(bundle):
+    st.markdown('<div class="section-header">📋 Detailed Tables</div>', unsafe_allow_html=True)
+
+    st.markdown("### Overall Performance")
+    paged_dataframe(bundle["perf_table"], key="perf")
 
-# Dynamic Height Calculation (25px per staff member + buffer) to show ALL staff
-dynamic_height = max(400, 200 + (len(staff_sorted_df) * 25))
-
-tab1, tab2, tab3 = st.tabs(["🏥 Clinics", "⚕️ Operations", "💵 Financial"])
-
-with tab1:
-    fig = px.bar(staff_sorted_df.sort_values("opened clinic", ascending=True), 
-                 y="staff name", x="opened clinic", 
-                 color="Degree Group", title="Clinics by Staff (All)", orientation='h',
-                 color_discrete_map=blue_scale_map)
-    fig.update_layout(height=dynamic_height)
-    st.plotly_chart(fig, use_container_width=True)
-
-with tab2:
-    fig = px.bar(staff_sorted_df.sort_values("Operation total number", ascending=True), 
-                 y="staff name", x="Operation total number", 
-                 color="Degree Group", title="Operations by Staff (All)", orientation='h',
-                 color_discrete_map=blue_scale_map)
-    fig.update_layout(height=dynamic_height)
-    st.plotly_chart(fig, use_container_width=True)
-    
     col1, col2 = st.columns(2)
     with col1:
-        fig = px.bar(x=["Elective", "Emergency"], y=[elective, emergency], title="Operations by Type", 
-                     color=["Elective", "Emergency"], color_discrete_map={"Elective": "#1e3a8a", "Emergency": "#60a5fa"})
-        st.plotly_chart(fig, use_container_width=True)
+        st.markdown("### Operation Source")
+        paged_dataframe(bundle["op_source_table"], key="op_source")
     with col2:
-        fig = px.bar(x=["High", "Moderate", "Low"], y=[high, moderate, low], title="Operations by Value",
-                     color=["High", "Moderate", "Low"], color_discrete_map={"High": "#172554", "Moderate": "#2563eb", "Low": "#93c5fd"})
-        st.plotly_chart(fig, use_container_width=True)
-
-with tab3:
-    fig = px.bar(staff_sorted_df.sort_values("Net", ascending=True), 
-                 y="staff name", x="Net",
-                 color="Degree Group", title="Net Income by Staff (All)", orientation='h',
-                 color_discrete_map=blue_scale_map)
-    fig.update_layout(height=dynamic_height)
-    st.plotly_chart(fig, use_container_width=True)
-
-# Data Tables
-st.markdown('<div class="section-header">📋 Detailed Tables</div>', unsafe_allow_html=True)
-
-perf_table = staff_sorted_df[["staff name", "degree", "total hours", "opened clinic", "Total visits", "Operation total number"]].copy()
-perf_table.columns = ["Staff Name", "Degree", "Total Hours", "Opened Clinics", "Total Visits", "Total Operations"]
-perf_table["Avg. Clinics"] = (perf_table["Opened Clinics"] / 10).round(2)
-perf_table["Avg. Operations"] = (perf_table["Total Operations"] / 10).round(2)
-
-st.markdown("### Overall Performance")
-st.dataframe(perf_table, use_container_width=True, hide_index=True)
-
-op_source_table = staff_sorted_df[["staff name", "degree", "opr_elective", "opr_emergency", "Operation total number"]].copy()
-op_source_table.columns = ["Staff Name", "Degree", "Elective", "Emergency", "Total Operations"]
-
-op_value_table = staff_sorted_df[["staff name", "degree", "opr_high", "opr_moderate", "opr_low", "Operation total number"]].copy()
-op_value_table.columns = ["Staff Name", "Degree", "High", "Moderate", "Low", "Total Operations"]
-
-col1, col2 = st.columns(2)
-with col1:
-    st.markdown("### Operation Source")
-    st.dataframe(op_source_table, use_container_width=True, hide_index=True)
-with col2:
-    st.markdown("### Operation Value")
-    st.dataframe(op_value_table, use_container_width=True, hide_index=True)
-
-fin_table = staff_sorted_df[["staff name", "degree", "total slary", "total income", "Net"]].copy()
-fin_table.columns = ["Staff Name", "Degree", "Total Salary", "Total Income", "Net Income"]
-
-st.markdown("### Financial Performance")
-st.dataframe(fin_table, use_container_width=True, hide_index=True)
-
-# PDF Generation
-if st.button("📄 Generate PDF Report"):
-    try:
-        pdf_buffer = generate_pdf(dept_df, department, detailed_tables, perf_table, op_source_table, op_value_table, fin_table)
-        st.download_button("📥 Download PDF", data=pdf_buffer, file_name=f"{department}_report.pdf", mime="application/pdf")
-    except Exception as e:
-        st.error(f"PDF generation failed: {e}")
-
-
+        st.markdown("### Operation Value")
+        paged_dataframe(bundle["op_value_table"], key="op_value")
+
+    st.markdown("### Financial Performance")
+    paged_dataframe(bundle["fin_table"], key="fin")
+
+@st.fragment
+def pdf_section(bundle, department):
+    if st.button("📄 Generate PDF Report"):
+        try:
+            pdf_bytes = generate_pdf(department, bundle["detailed_tables"], bundle["degree_contracts"], bundle["perf_table"],
+                                     bundle["op_source_table"], bundle["op_value_table"], bundle["fin_table"])
+            st.download_button("📥 Download PDF", data=pdf_bytes, file_name=f"{department}_report.pdf", mime="application/pdf")
+        except Exception as e:
+            st.error(f"PDF generation failed: {e}")
+
+bundle = build_department_bundle(df, department)
+
+manpower_overview(bundle)
+staff_breakdown(bundle)
+performance_metrics(bundle)
+operations_overview(bundle)
+financial_performance(bundle)
+staff_analytics(bundle)
+detailed_tables_section(bundle)
+pdf_section(bundle, department)